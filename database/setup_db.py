@@ -1,6 +1,9 @@
+import asyncio
+
+import models  # noqa: F401  registers the tables with SQLModel.metadata
 from database import create_db_and_tables
 
 if __name__ == "__main__":
     print("Initializing database...")
-    create_db_and_tables()
+    asyncio.run(create_db_and_tables())
     print("Database initialized successfully.")
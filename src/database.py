@@ -1,20 +1,97 @@
-from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 import os
 
 # Database config
 sqlite_file_name = "weather_database.db"
-sqlite_url = f"sqlite:///./{sqlite_file_name}"
+sqlite_url = f"sqlite+aiosqlite:///./{sqlite_file_name}"
 
-# Create the SQLAlchemy engine for the SQLite database
-engine = create_engine(sqlite_url, echo=False)
+# Create the async SQLAlchemy engine for the SQLite database.
+# Its connection pool keeps aiosqlite connections (and SQLite's page cache)
+# alive between requests instead of reconnecting every time, and the
+# compiled statement cache lets the hot queries skip SQL compilation.
+engine = create_async_engine(sqlite_url, echo=False, query_cache_size=1200)
 
-def create_db_and_tables():
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tunes every new SQLite connection: WAL so readers don't wait on writers,
+    NORMAL sync (one fsync less per commit, still safe under WAL), a 64 MB
+    page cache, in-memory temp tables and a 256 MB memory map. Foreign keys
+    are enforced so deleting a location cascades to its snapshots.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+# Session factory; objects stay loaded after commit so handlers can keep
+# returning them without triggering a lazy refresh.
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+async def create_db_and_tables(db_engine=engine):
     """
     Creates the database file and all tables defined in the models.
     Called on application startup.
     """
-    SQLModel.metadata.create_all(engine)
+    async with db_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await migrate_indexes(conn)
+
+async def migrate_indexes(conn):
+    """
+    create_all skips tables that already exist, so databases created before
+    an index was added to the models get it here instead. Does nothing if
+    the tables are missing (models not imported before create_all).
+    """
+    tables = {row[0] for row in (await conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    )))}
+    if not {"location", "weathersnapshot"} <= tables:
+        return
+
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_ws_loc_ts ON weathersnapshot (location_id, timestamp)"
+    ))
+
+    has_unique_latlon = (await conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uq_loc_latlon'"
+    ))).first()
+    if not has_unique_latlon:
+        # The old check-then-insert could store the same city twice; keep the
+        # oldest row per (lat, lon), carry the duplicates' settings and
+        # snapshots over to it, then drop the duplicates
+        await conn.execute(text(
+            "UPDATE location SET"
+            " is_favorite = (SELECT MAX(dup.is_favorite) FROM location AS dup"
+            "  WHERE dup.lat = location.lat AND dup.lon = location.lon),"
+            " display_name = COALESCE(display_name, (SELECT dup.display_name FROM location AS dup"
+            "  WHERE dup.lat = location.lat AND dup.lon = location.lon AND dup.display_name IS NOT NULL"
+            "  ORDER BY dup.id LIMIT 1)),"
+            " last_synced = (SELECT MAX(dup.last_synced) FROM location AS dup"
+            "  WHERE dup.lat = location.lat AND dup.lon = location.lon)"
+            " WHERE id IN (SELECT MIN(id) FROM location GROUP BY lat, lon HAVING COUNT(*) > 1)"
+        ))
+        await conn.execute(text(
+            "UPDATE weathersnapshot SET location_id = ("
+            " SELECT MIN(keep.id) FROM location AS dup"
+            " JOIN location AS keep ON keep.lat = dup.lat AND keep.lon = dup.lon"
+            " WHERE dup.id = weathersnapshot.location_id"
+            ") WHERE location_id IN (SELECT id FROM location)"
+        ))
+        await conn.execute(text(
+            "DELETE FROM location WHERE id NOT IN (SELECT MIN(id) FROM location GROUP BY lat, lon)"
+        ))
+        await conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_loc_latlon ON location (lat, lon)"
+        ))
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with AsyncSessionLocal() as session:
         yield session
@@ -1,40 +1,75 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from sqlmodel import Session, select
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+from sqlmodel import delete, insert, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
-from .database import engine, create_db_and_tables, get_session
+from .database import AsyncSessionLocal, create_db_and_tables
 from .models import Location, WeatherSnapshot
 from . import weather_api
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Handles application startup and shutdown events.
-    In this case, it ensures the database and tables are created on startup.
+    Creates the database and tables on startup and opens the shared
+    OpenWeather HTTP client, which is closed again on shutdown.
     """
-    create_db_and_tables()
+    await create_db_and_tables()
+    weather_api.client = weather_api.create_client()
     yield
+    await weather_api.client.aclose()
+    weather_api.client = None
 
-app = FastAPI(title="Weather Data Integration Platform", lifespan=lifespan)
+app = FastAPI(title="Weather Data Integration Platform", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles that lets browsers reuse assets for an hour before
+    revalidating them (with ETag/Last-Modified) against the server.
+    """
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=3600"
+        return response
 
 # Mount static files
-app.mount("/static", StaticFiles(directory="src/static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="src/static"), name="static")
 
 # Dependency for database session
-def get_db():
-    with Session(engine) as session:
+async def get_db():
+    async with AsyncSessionLocal() as session:
         yield session
 
-@app.get("/api/locations", response_model=List[Location])
-def read_locations(session: Session = Depends(get_db)):
+# Columns returned by the location listing
+LOCATION_COLUMNS = (
+    Location.id,
+    Location.name,
+    Location.country,
+    Location.lat,
+    Location.lon,
+    Location.display_name,
+    Location.is_favorite,
+    Location.last_synced,
+)
+LOCATION_KEYS = tuple(column.key for column in LOCATION_COLUMNS)
+
+@app.get("/api/locations")
+async def read_locations(session: AsyncSession = Depends(get_db)):
     """
     Retrieve all tracked locations from the database.
+    Selects plain column tuples rather than ORM objects and returns them
+    directly, skipping FastAPI's response_model validation pass.
     """
-    locations = session.exec(select(Location)).all()
-    return locations
+    rows = (await session.exec(select(*LOCATION_COLUMNS))).all()
+    return ORJSONResponse([dict(zip(LOCATION_KEYS, row)) for row in rows])
 
 @app.get("/api/search")
 async def search_cities(q: str):
@@ -49,43 +84,47 @@ async def search_cities(q: str):
     return suggestions
 
 @app.post("/api/locations", response_model=Location)
-async def create_location(city_name: str, session: Session = Depends(get_db)):
+async def create_location(city_name: str, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_db)):
     """
     Add a new city to the watchlist.
     Steps:
     1. Resolve city name to coordinates using the Geocoding API.
-    2. Check if the city already exists in our local DB.
-    3. Save the new location and trigger an initial weather sync.
+    2. Insert the location, or return the existing row if the city is already tracked.
+    3. Schedule an initial weather sync for newly added cities, which runs
+       after the response has been sent.
     """
     # 1. Get coords from API
     geo_data = await weather_api.get_coordinates(city_name)
     if not geo_data:
         raise HTTPException(status_code=404, detail="City not found or API error")
     
-    # Check if city already exists (prevent duplicates by lat/lon)
-    existing = session.exec(select(Location).where(Location.lat == geo_data["lat"], Location.lon == geo_data["lon"])).first()
-    if existing:
-        return existing
-
-    # 2. Save to DB
-    location = Location(
-        name=geo_data["name"],
-        country=geo_data["country"],
-        lat=geo_data["lat"],
-        lon=geo_data["lon"]
+    # 2. Save to DB; the unique (lat, lon) constraint turns a duplicate into a no-op
+    insert_stmt = (
+        sqlite_insert(Location)
+        .values(
+            name=geo_data["name"],
+            country=geo_data["country"],
+            lat=geo_data["lat"],
+            lon=geo_data["lon"]
+        )
+        .on_conflict_do_nothing(index_elements=["lat", "lon"])
+        .returning(Location)
     )
-    session.add(location)
-    session.commit()
-    session.refresh(location)
+    location = (await session.exec(insert_stmt)).scalar_one_or_none()
+    if location is None:
+        # City already exists, return the stored row
+        return (await session.exec(select(Location).where(Location.lat == geo_data["lat"], Location.lon == geo_data["lon"]))).one()
     
-    # 3. Initial sync to fetch weather data immediately
-    await sync_location_weather(location.id, session)
+    await session.commit()
+    
+    # 3. Initial sync happens off the request path
+    background_tasks.add_task(initial_sync, location.id, session.bind)
     
     return location
 
 @app.patch("/api/locations/{location_id}", response_model=Location)
-def update_location(location_id: int, is_favorite: Optional[bool] = None, display_name: Optional[str] = None, session: Session = Depends(get_db)):
-    location = session.get(Location, location_id)
+async def update_location(location_id: int, is_favorite: Optional[bool] = None, display_name: Optional[str] = None, session: AsyncSession = Depends(get_db)):
+    location = await session.get(Location, location_id)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
@@ -95,44 +134,85 @@ def update_location(location_id: int, is_favorite: Optional[bool] = None, displa
         location.display_name = display_name
         
     session.add(location)
-    session.commit()
-    session.refresh(location)
+    await session.commit()
+    await session.refresh(location)
     return location
 
 @app.delete("/api/locations/{location_id}")
-def delete_location(location_id: int, session: Session = Depends(get_db)):
-    location = session.get(Location, location_id)
+async def delete_location(location_id: int, session: AsyncSession = Depends(get_db)):
+    location = await session.get(Location, location_id)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
-    # Delete snapshots first (or let CASCADE handle it if configured, but SQLModel default is manual)
-    snapshots = session.exec(select(WeatherSnapshot).where(WeatherSnapshot.location_id == location_id)).all()
-    for s in snapshots:
-        session.delete(s)
-        
-    session.delete(location)
-    session.commit()
+    # Delete snapshots in one statement (tables created before the FK had
+    # ON DELETE CASCADE still need this)
+    await session.exec(delete(WeatherSnapshot).where(WeatherSnapshot.location_id == location_id))
+    
+    await session.delete(location)
+    await session.commit()
     return {"ok": True}
 
+@app.get("/api/weather")
+async def get_weather_bulk(ids: str = Query(..., description="Comma-separated location ids, e.g. 1,2,3"), session: AsyncSession = Depends(get_db)):
+    """
+    Get the weather data for several locations in one request (?ids=1,2,3).
+    Returns a list shaped like /api/weather/{location_id}; unknown ids are skipped.
+    """
+    try:
+        location_ids = [int(part) for part in ids.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    
+    locations = (await session.exec(select(Location).where(Location.id.in_(location_ids)))).all()
+    
+    # Fetch all live forecasts concurrently while we query the local DB
+    forecasts_future = asyncio.gather(*(weather_api.get_forecast(l.lat, l.lon) for l in locations))
+    
+    # Latest snapshot per location in a single query
+    ranked = select(
+        WeatherSnapshot,
+        func.row_number().over(
+            partition_by=WeatherSnapshot.location_id,
+            order_by=WeatherSnapshot.timestamp.desc()
+        ).label("rank")
+    ).where(WeatherSnapshot.location_id.in_(location_ids)).subquery()
+    latest = aliased(WeatherSnapshot, ranked)
+    snapshots = (await session.exec(select(latest).where(ranked.c.rank == 1))).all()
+    latest_by_location = {s.location_id: s for s in snapshots}
+    
+    forecasts = await forecasts_future
+    
+    return [
+        {
+            "location": location,
+            "current": latest_by_location.get(location.id),
+            "forecast": forecast
+        }
+        for location, forecast in zip(locations, forecasts)
+    ]
+
 @app.get("/api/weather/{location_id}")
-async def get_weather(location_id: int, session: Session = Depends(get_db)):
+async def get_weather(location_id: int, session: AsyncSession = Depends(get_db)):
     """
     Get the weather data for a specific location.
     Returns the latest stored snapshot (Current) and the live 5-day forecast.
     """
-    location = session.get(Location, location_id)
+    location = await session.get(Location, location_id)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
+    # Start the live forecast request so it runs while we query the local DB
+    forecast_task = asyncio.create_task(weather_api.get_forecast(location.lat, location.lon))
+    
     # Get latest snapshot from processed local DB
-    latest_snapshot = session.exec(
+    latest_snapshot = (await session.exec(
         select(WeatherSnapshot)
         .where(WeatherSnapshot.location_id == location_id)
         .order_by(WeatherSnapshot.timestamp.desc())
-    ).first()
+    )).first()
     
-    # Fetch live 5-day forecast from API
-    forecast = await weather_api.get_forecast(location.lat, location.lon)
+    # Live 5-day forecast from API
+    forecast = await forecast_task
     
     return {
         "location": location,
@@ -140,9 +220,51 @@ async def get_weather(location_id: int, session: Session = Depends(get_db)):
         "forecast": forecast
     }
 
+@app.post("/api/sync")
+async def sync_all_locations(session: AsyncSession = Depends(get_db)):
+    """
+    Sync every tracked location at once.
+    Current weather is fetched concurrently and all snapshots are written
+    in a single transaction (one commit instead of one per location).
+    """
+    locations = (await session.exec(select(Location))).all()
+    if not locations:
+        return {"status": "success", "synced": 0, "failed": 0}
+    
+    results = await asyncio.gather(*(weather_api.get_current_weather(l.lat, l.lon) for l in locations))
+    
+    now = datetime.utcnow()
+    rows = [
+        {
+            "location_id": location.id,
+            "temp": weather_data["temp"],
+            "description": weather_data["description"],
+            "icon": weather_data["icon"],
+            "humidity": weather_data["humidity"],
+            "wind_speed": weather_data["wind_speed"],
+            "feels_like": weather_data["feels_like"],
+            "timestamp": now
+        }
+        for location, weather_data in zip(locations, results)
+        if weather_data
+    ]
+    if not rows:
+        raise HTTPException(status_code=503, detail="Weather API unavailable")
+    
+    # Core executemany: one prepared INSERT reused for every row
+    connection = await session.connection()
+    await connection.execute(insert(WeatherSnapshot.__table__), rows)
+    await session.exec(
+        update(Location)
+        .where(Location.id.in_([row["location_id"] for row in rows]))
+        .values(last_synced=now)
+    )
+    await session.commit()
+    return {"status": "success", "synced": len(rows), "failed": len(locations) - len(rows)}
+
 @app.post("/api/sync/{location_id}")
-async def sync_location_weather(location_id: int, session: Session = Depends(get_db)):
-    location = session.get(Location, location_id)
+async def sync_location_weather(location_id: int, session: AsyncSession = Depends(get_db)):
+    location = await session.get(Location, location_id)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
@@ -151,9 +273,15 @@ async def sync_location_weather(location_id: int, session: Session = Depends(get
     if not weather_data:
         raise HTTPException(status_code=503, detail="Weather API unavailable")
     
-    # Save snapshot
+    snapshot = await save_snapshot(location, weather_data, session)
+    return {"status": "success", "data": snapshot}
+
+async def save_snapshot(location: Location, weather_data: dict, session: AsyncSession) -> WeatherSnapshot:
+    """
+    Store a weather reading for a location and update its sync timestamp.
+    """
     snapshot = WeatherSnapshot(
-        location_id=location_id,
+        location_id=location.id,
         temp=weather_data["temp"],
         description=weather_data["description"],
         icon=weather_data["icon"],
@@ -167,8 +295,24 @@ async def sync_location_weather(location_id: int, session: Session = Depends(get
     location.last_synced = datetime.utcnow()
     session.add(location)
     
-    session.commit()
-    return {"status": "success", "data": snapshot}
+    await session.commit()
+    return snapshot
+
+async def initial_sync(location_id: int, bind) -> None:
+    """
+    Fetch and store the first weather snapshot for a newly added location.
+    Runs as a background task, so it opens its own session on the same engine
+    as the request (the request session is closed by then) and skips quietly
+    if the Weather API is unavailable.
+    """
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        location = await session.get(Location, location_id)
+        if not location:
+            return
+        
+        weather_data = await weather_api.get_current_weather(location.lat, location.lon)
+        if weather_data:
+            await save_snapshot(location, weather_data, session)
 
 @app.get("/")
 def read_root():
@@ -1,11 +1,15 @@
 from datetime import datetime
 from typing import List, Optional
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 
 class Location(SQLModel, table=True):
     """
     Represents a geographical location (City) tracked by the user.
     """
+    # One row per coordinate pair; create_location upserts against it
+    __table_args__ = (Index("uq_loc_latlon", "lat", "lon", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     country: str
@@ -16,15 +20,21 @@ class Location(SQLModel, table=True):
     last_synced: Optional[datetime] = None
     
     # Relationship to snapshots
-    snapshots: List["WeatherSnapshot"] = Relationship(back_populates="location")
+    snapshots: List["WeatherSnapshot"] = Relationship(
+        back_populates="location",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "passive_deletes": True}
+    )
 
 class WeatherSnapshot(SQLModel, table=True):
     """
     A point-in-time record of weather conditions for a specific location.
     Used for local data persistence and historical tracking.
     """
+    # Serves "latest snapshot for a location" (SQLite walks it backwards for DESC)
+    __table_args__ = (Index("ix_ws_loc_ts", "location_id", "timestamp"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    location_id: int = Field(foreign_key="location.id")
+    location_id: int = Field(foreign_key="location.id", ondelete="CASCADE")
     temp: float
     description: str
     icon: str
@@ -83,50 +83,68 @@ document.addEventListener('DOMContentLoaded', () => {
             });
 
             locationGrid.appendChild(card);
-            loadWeatherData(loc.id);
         });
         renderIcons();
+        loadWeatherData(locations.map(loc => loc.id));
     }
 
     /**
-     * Load the current weather data snapshot for a specific card.
-     * This separates the list rendering from individual weather data fetching.
+     * Load the current weather snapshots for all cards in a single request.
+     * This separates the list rendering from the weather data fetching.
+     * Newly added cities are synced in the background, so cards without a
+     * snapshot yet are retried once shortly after.
      */
-    async function loadWeatherData(id) {
-        const container = document.getElementById(`weather-${id}`);
+    async function loadWeatherData(ids, retry = true) {
         try {
-            const res = await fetch(`/api/weather/${id}`);
-            const data = await res.json();
-            const current = data.current;
-
-            if (!current) {
-                container.innerHTML = '<div class="loading">No data found. Syncing...</div>';
-                return;
+            const res = await fetch(`/api/weather?ids=${ids.join(',')}`);
+            if (!res.ok) throw new Error('Failed to load weather');
+            const entries = await res.json();
+            entries.forEach(entry => renderWeatherData(entry.location.id, entry.current));
+
+            const pending = entries.filter(entry => !entry.current).map(entry => entry.location.id);
+            if (retry && pending.length > 0) {
+                setTimeout(() => loadWeatherData(pending, false), 2000);
             }
+        } catch (err) {
+            ids.forEach(id => {
+                const container = document.getElementById(`weather-${id}`);
+                if (container) container.innerHTML = '<div class="loading">Error loading weather</div>';
+            });
+        }
+    }
 
-            container.innerHTML = `
-                <div class="weather-main">
-                    <div class="temp-large">${Math.round(current.temp)}°</div>
-                    <div class="weather-desc">
-                        <img src="https://openweathermap.org/img/wn/${current.icon}@2x.png" alt="${current.description}">
-                        <p>${current.description}</p>
-                    </div>
+    /**
+     * Render the current weather snapshot into a city card.
+     */
+    function renderWeatherData(id, current) {
+        const container = document.getElementById(`weather-${id}`);
+        if (!container) return;
+
+        if (!current) {
+            container.innerHTML = '<div class="loading">No data found. Syncing...</div>';
+            return;
+        }
+
+        container.innerHTML = `
+            <div class="weather-main">
+                <div class="temp-large">${Math.round(current.temp)}°</div>
+                <div class="weather-desc">
+                    <img src="https://openweathermap.org/img/wn/${current.icon}@2x.png" alt="${current.description}">
+                    <p>${current.description}</p>
                 </div>
-                <div class="weather-details">
-                    <div class="detail-item">
-                        <i data-lucide="droplets"></i>
-                        <span>${current.humidity}%</span>
-                    </div>
-                    <div class="detail-item">
-                        <i data-lucide="wind"></i>
-                        <span>${current.wind_speed} m/s</span>
-                    </div>
+            </div>
+            <div class="weather-details">
+                <div class="detail-item">
+                    <i data-lucide="droplets"></i>
+                    <span>${current.humidity}%</span>
                 </div>
-            `;
-            renderIcons();
-        } catch (err) {
-            container.innerHTML = '<div class="loading">Error loading weather</div>';
-        }
+                <div class="detail-item">
+                    <i data-lucide="wind"></i>
+                    <span>${current.wind_speed} m/s</span>
+                </div>
+            </div>
+        `;
+        renderIcons();
     }
 
     /**
@@ -291,13 +309,11 @@ document.addEventListener('DOMContentLoaded', () => {
         syncAllBtn.classList.add('spinning');
         showToast('Syncing all cities...');
 
-        const syncPromises = locations.map(loc =>
-            fetch(`/api/sync/${loc.id}`, { method: 'POST' })
-        );
-
         try {
-            await Promise.all(syncPromises);
-            showToast('All cities synced!');
+            const res = await fetch('/api/sync', { method: 'POST' });
+            if (!res.ok) throw new Error('Sync failed');
+            const result = await res.json();
+            showToast(result.failed ? 'Some syncs failed' : 'All cities synced!', result.failed ? 'error' : 'success');
             fetchLocations();
         } catch (err) {
             showToast('Some syncs failed', 'error');
@@ -1,122 +1,165 @@
 import httpx
+import logging
+import orjson
 import os
+import time
+from functools import wraps
 from dotenv import load_dotenv
-from typing import Optional, List, Dict
-from datetime import datetime
+from typing import Any, Optional, List, Dict
+from datetime import datetime, timezone
 
 load_dotenv()
 
 API_KEY = os.getenv("OPENWEATHER_API_KEY", "YOUR_API_KEY_HERE")
-BASE_URL = "https://api.openweathermap.org/data/2.5"
-GEO_URL = "https://api.openweathermap.org/geo/1.0"
+API_ROOT = "https://api.openweathermap.org"
+BASE_URL = "/data/2.5"
+GEO_URL = "/geo/1.0"
+UTC = timezone.utc
 
+GEO_DIRECT_URL = f"{GEO_URL}/direct"
+CURRENT_URL = f"{BASE_URL}/weather"
+FORECAST_URL = f"{BASE_URL}/forecast"
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP client, opened and closed by the application lifespan so every
+# call reuses the same keep-alive connection to OpenWeather.
+client: Optional[httpx.AsyncClient] = None
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Builds the long-lived client used for all OpenWeather requests.
+    """
+    return httpx.AsyncClient(
+        base_url=API_ROOT,
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    )
+
+def ttl_cache(ttl: float, maxsize: int = 1024):
+    """
+    Caches the result of an async function per argument tuple for `ttl` seconds.
+    Empty results (the API helpers' error values) are never cached.
+    """
+    def decorator(func):
+        cache: Dict[tuple, tuple] = {}
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            entry = cache.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+            value = await func(*args, **kwargs)
+            if value:
+                if len(cache) >= maxsize:
+                    # Drop expired entries first, then the oldest insertion
+                    for k in [k for k, (expires_at, _) in cache.items() if expires_at <= now]:
+                        del cache[k]
+                    if len(cache) >= maxsize:
+                        del cache[next(iter(cache))]
+                cache[key] = (now + ttl, value)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+async def _get(url: str, **params) -> Any:
+    """
+    Performs an authenticated GET against the OpenWeather API and returns the
+    decoded JSON body. Raises on transport errors and non-2xx responses.
+    """
+    params["appid"] = API_KEY
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+# Geocoding results are effectively static; forecasts follow OpenWeather's
+# recommendation of not polling more often than every 10 minutes. Current
+# weather is only fetched by explicit syncs, so it is never cached.
+@ttl_cache(ttl=24 * 3600)
 async def search_cities(query: str) -> List[Dict]:
     """
     Search for cities matching a query string using OpenWeather Geocoding API.
     Returns a list of up to 5 matching locations with name, country, and state.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {
-                "q": query,
-                "limit": 5,
-                "appid": API_KEY
+    try:
+        data = await _get(GEO_DIRECT_URL, q=query, limit=5)
+        return [
+            {
+                "name": item["name"],
+                "country": item["country"],
+                "state": item.get("state", ""),
+                "lat": item["lat"],
+                "lon": item["lon"]
             }
-            response = await client.get(f"{GEO_URL}/direct", params=params)
-            response.raise_for_status()
-            data = response.json()
-            results = []
-            for item in data:
-                results.append({
-                    "name": item["name"],
-                    "country": item["country"],
-                    "state": item.get("state", ""),
-                    "lat": item["lat"],
-                    "lon": item["lon"]
-                })
-            return results
-        except Exception as e:
-            print(f"Error searching cities: {e}")
+            for item in data
+        ]
+    except Exception:
+        logger.exception("Error searching cities")
     return []
 
+@ttl_cache(ttl=24 * 3600)
 async def get_coordinates(city_name: str) -> Optional[Dict]:
     """
     Calls the OpenWeather Geocoding API to get latitude and longitude for a city name.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {
-                "q": city_name,
-                "limit": 1,
-                "appid": API_KEY
+    try:
+        data = await _get(GEO_DIRECT_URL, q=city_name, limit=1)
+        if data:
+            return {
+                "lat": data[0]["lat"],
+                "lon": data[0]["lon"],
+                "name": data[0]["name"],
+                "country": data[0]["country"]
             }
-            response = await client.get(f"{GEO_URL}/direct", params=params)
-            response.raise_for_status()
-            data = response.json()
-            if data:
-                return {
-                    "lat": data[0]["lat"],
-                    "lon": data[0]["lon"],
-                    "name": data[0]["name"],
-                    "country": data[0]["country"]
-                }
-        except Exception as e:
-            print(f"Error fetching coordinates: {e}")
+    except Exception:
+        logger.exception("Error fetching coordinates")
     return None
 
 async def get_current_weather(lat: float, lon: float, units: str = "metric") -> Optional[Dict]:
     """
     Fetches the current weather conditions for specific coordinates.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "units": units,
-                "appid": API_KEY
-            }
-            response = await client.get(f"{BASE_URL}/weather", params=params)
-            response.raise_for_status()
-            data = response.json()
-            return {
-                "temp": data["main"]["temp"],
-                "description": data["weather"][0]["description"],
-                "icon": data["weather"][0]["icon"],
-                "humidity": data["main"]["humidity"],
-                "wind_speed": data["wind"]["speed"],
-                "feels_like": data["main"]["feels_like"]
-            }
-        except Exception as e:
-            print(f"Error fetching current weather: {e}")
+    try:
+        data = await _get(CURRENT_URL, lat=lat, lon=lon, units=units)
+        main = data["main"]
+        weather = data["weather"][0]
+        return {
+            "temp": main["temp"],
+            "description": weather["description"],
+            "icon": weather["icon"],
+            "humidity": main["humidity"],
+            "wind_speed": data["wind"]["speed"],
+            "feels_like": main["feels_like"]
+        }
+    except Exception:
+        logger.exception("Error fetching current weather")
     return None
 
+@ttl_cache(ttl=1800)
 async def get_forecast(lat: float, lon: float, units: str = "metric") -> List[Dict]:
     """
     Fetches the 5-day weather forecast (in 3-hour intervals) for specific coordinates.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "units": units,
-                "appid": API_KEY
+    try:
+        data = await _get(FORECAST_URL, lat=lat, lon=lon, units=units)
+        
+        # Extract 5-day forecast (OpenWeather gives 3-hour intervals, as UTC epochs)
+        return [
+            {
+                "temp": item["main"]["temp"],
+                "description": weather["description"],
+                "icon": weather["icon"],
+                "timestamp": datetime.fromtimestamp(item["dt"], UTC)
             }
-            response = await client.get(f"{BASE_URL}/forecast", params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract 5-day forecast (OpenWeather gives 3-hour intervals)
-            forecast = []
-            for item in data["list"]:
-                forecast.append({
-                    "temp": item["main"]["temp"],
-                    "description": item["weather"][0]["description"],
-                    "icon": item["weather"][0]["icon"],
-                    "timestamp": datetime.fromtimestamp(item["dt"])
-                })
-            return forecast
-        except Exception as e:
-            print(f"Error fetching forecast: {e}")
+            for item in data["list"]
+            for weather in (item["weather"][0],)
+        ]
+    except Exception:
+        logger.exception("Error fetching forecast")
     return []
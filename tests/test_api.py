@@ -1,10 +1,17 @@
+import asyncio
+from datetime import datetime, timezone
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine, select
 from sqlmodel.pool import StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 
+from src import weather_api
+from src.database import create_db_and_tables
 from src.main import app, get_db
-from src.models import Location
+from src.models import Location, WeatherSnapshot
 
 # Setup file-based SQLite for testing
 sqlite_url = "sqlite:///test.db"
@@ -13,8 +20,10 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
 )
 
-def override_get_db():
-    with Session(engine) as session:
+async_engine = create_async_engine("sqlite+aiosqlite:///test.db")
+
+async def override_get_db():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
@@ -66,6 +75,12 @@ async def test_create_location_success(session: Session):
         location = session.exec(select(Location).where(Location.name == "London")).first()
         assert location is not None
         assert location.lat == 51.5074
+        
+        # Initial sync ran as a background task after the response
+        mock_curr.assert_awaited_once_with(51.5074, -0.1278)
+        snapshot = session.exec(select(WeatherSnapshot).where(WeatherSnapshot.location_id == location.id)).first()
+        assert snapshot is not None
+        assert snapshot.temp == 15.5
 
 def test_read_locations_after_creation(session: Session):
     # Setup some data
@@ -77,3 +92,224 @@ def test_read_locations_after_creation(session: Session):
     assert response.status_code == 200
     assert len(response.json()) == 1
     assert response.json()[0]["name"] == "Paris"
+
+def test_delete_location_removes_snapshots(session: Session):
+    loc = Location(name="Berlin", country="DE", lat=52.52, lon=13.405)
+    session.add(loc)
+    session.commit()
+    location_id = loc.id
+    for temp in (10.0, 11.0):
+        session.add(WeatherSnapshot(location_id=location_id, temp=temp, description="cloudy", icon="03d", humidity=70, wind_speed=3.0, feels_like=temp))
+    session.commit()
+    
+    response = client.delete(f"/api/locations/{location_id}")
+    assert response.status_code == 200
+    
+    session.expunge_all()
+    assert session.get(Location, location_id) is None
+    assert session.exec(select(WeatherSnapshot)).all() == []
+
+def test_forecast_is_cached_between_calls():
+    calls = []
+    
+    def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"list": [
+            {"dt": 1700000000, "main": {"temp": 12.0}, "weather": [{"description": "rain", "icon": "10d"}]}
+        ]})
+    
+    async def fetch_twice():
+        weather_api.get_forecast.cache_clear()
+        weather_api.client = httpx.AsyncClient(base_url=weather_api.API_ROOT, transport=httpx.MockTransport(handler))
+        try:
+            first = await weather_api.get_forecast(10.0, 20.0)
+            second = await weather_api.get_forecast(10.0, 20.0)
+        finally:
+            await weather_api.client.aclose()
+            weather_api.client = None
+            weather_api.get_forecast.cache_clear()
+        return first, second
+    
+    first, second = asyncio.run(fetch_twice())
+    assert first == second
+    assert first[0]["temp"] == 12.0
+    assert first[0]["timestamp"] == datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc)
+    assert len(calls) == 1
+
+def test_get_weather_bulk_returns_latest_snapshot_per_location(session: Session):
+    paris = Location(name="Paris", country="FR", lat=48.8566, lon=2.3522)
+    rome = Location(name="Rome", country="IT", lat=41.9028, lon=12.4964)
+    session.add(paris)
+    session.add(rome)
+    session.commit()
+    paris_id, rome_id = paris.id, rome.id
+    for temp, ts in ((10.0, datetime(2024, 1, 1, 8)), (14.0, datetime(2024, 1, 1, 12))):
+        session.add(WeatherSnapshot(location_id=paris_id, temp=temp, description="clear sky", icon="01d", humidity=40, wind_speed=2.0, feels_like=temp, timestamp=ts))
+    session.commit()
+    
+    with patch("src.weather_api.get_forecast", new_callable=AsyncMock) as mock_forecast:
+        mock_forecast.return_value = []
+        response = client.get(f"/api/weather?ids={paris_id},{rome_id},999")
+    
+    assert response.status_code == 200
+    data = {entry["location"]["name"]: entry for entry in response.json()}
+    assert set(data) == {"Paris", "Rome"}
+    assert data["Paris"]["current"]["temp"] == 14.0
+    assert data["Rome"]["current"] is None
+    assert mock_forecast.await_count == 2
+
+def test_get_weather_bulk_rejects_malformed_ids():
+    response = client.get("/api/weather?ids=1,abc")
+    assert response.status_code == 422
+
+def test_create_location_returns_existing_duplicate(session: Session):
+    loc = Location(name="Paris", country="FR", lat=48.8566, lon=2.3522)
+    session.add(loc)
+    session.commit()
+    location_id = loc.id
+    
+    mock_geo = {"name": "Paris", "country": "FR", "lat": 48.8566, "lon": 2.3522}
+    with patch("src.weather_api.get_coordinates", new_callable=AsyncMock) as mock_coords, \
+         patch("src.weather_api.get_current_weather", new_callable=AsyncMock) as mock_curr:
+        mock_coords.return_value = mock_geo
+        
+        response = client.post("/api/locations?city_name=Paris")
+        
+        assert response.status_code == 200
+        assert response.json()["id"] == location_id
+        mock_curr.assert_not_awaited()
+    
+    assert len(session.exec(select(Location)).all()) == 1
+
+def test_sync_all_locations_writes_snapshots_in_one_batch(session: Session):
+    paris = Location(name="Paris", country="FR", lat=48.8566, lon=2.3522)
+    rome = Location(name="Rome", country="IT", lat=41.9028, lon=12.4964)
+    session.add(paris)
+    session.add(rome)
+    session.commit()
+    paris_id, rome_id = paris.id, rome.id
+    
+    mock_weather = {
+        "temp": 20.0,
+        "description": "clear sky",
+        "icon": "01d",
+        "humidity": 30,
+        "wind_speed": 1.5,
+        "feels_like": 19.0
+    }
+    
+    async def fake_current_weather(lat, lon, units="metric"):
+        # Rome's lookup fails, Paris succeeds
+        return mock_weather if lat == 48.8566 else None
+    
+    with patch("src.weather_api.get_current_weather", side_effect=fake_current_weather):
+        response = client.post("/api/sync")
+    
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "synced": 1, "failed": 1}
+    
+    session.expunge_all()
+    snapshots = session.exec(select(WeatherSnapshot)).all()
+    assert [s.location_id for s in snapshots] == [paris_id]
+    assert snapshots[0].temp == 20.0
+    assert session.get(Location, paris_id).last_synced is not None
+    assert session.get(Location, rome_id).last_synced is None
+
+def test_sync_all_locations_fetches_fresh_weather_each_time(session: Session):
+    session.add(Location(name="Paris", country="FR", lat=48.8566, lon=2.3522))
+    session.commit()
+    
+    calls = []
+    
+    def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={
+            "main": {"temp": 20.0 + len(calls), "humidity": 30, "feels_like": 19.0},
+            "weather": [{"description": "clear sky", "icon": "01d"}],
+            "wind": {"speed": 1.5}
+        })
+    
+    weather_api.client = httpx.AsyncClient(base_url=weather_api.API_ROOT, transport=httpx.MockTransport(handler))
+    try:
+        first = client.post("/api/sync")
+        second = client.post("/api/sync")
+    finally:
+        asyncio.run(weather_api.client.aclose())
+        weather_api.client = None
+    
+    assert first.json()["synced"] == 1
+    assert second.json()["synced"] == 1
+    assert len(calls) == 2
+    temps = sorted(s.temp for s in session.exec(select(WeatherSnapshot)).all())
+    assert temps == [21.0, 22.0]
+
+def test_static_assets_are_cacheable():
+    response = client.get("/static/style.css")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=3600"
+
+# Schema as created before indexes/constraints were added to the models
+OLD_SCHEMA = (
+    "CREATE TABLE location (id INTEGER NOT NULL, name VARCHAR NOT NULL, country VARCHAR NOT NULL, "
+    "lat FLOAT NOT NULL, lon FLOAT NOT NULL, display_name VARCHAR, is_favorite BOOLEAN NOT NULL, "
+    "last_synced DATETIME, PRIMARY KEY (id))",
+    "CREATE TABLE weathersnapshot (id INTEGER NOT NULL, location_id INTEGER NOT NULL, temp FLOAT NOT NULL, "
+    "description VARCHAR NOT NULL, icon VARCHAR NOT NULL, humidity INTEGER NOT NULL, wind_speed FLOAT NOT NULL, "
+    "feels_like FLOAT NOT NULL, timestamp DATETIME NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(location_id) REFERENCES location (id))",
+)
+
+def test_create_db_and_tables_migrates_old_schema(tmp_path):
+    db_path = tmp_path / "old.db"
+    old_engine = create_engine(f"sqlite:///{db_path}")
+    with old_engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.exec_driver_sql(statement)
+        # Duplicate city left behind by the old check-then-insert race
+        conn.exec_driver_sql(
+            "INSERT INTO location (id, name, country, lat, lon, is_favorite, display_name, last_synced) VALUES "
+            "(1, 'Paris', 'FR', 48.8566, 2.3522, 0, NULL, '2024-01-01 07:00:00.000000'), "
+            "(2, 'Paris', 'FR', 48.8566, 2.3522, 1, 'Fav', '2024-01-01 08:00:00.000000')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO weathersnapshot (location_id, temp, description, icon, humidity, wind_speed, feels_like, timestamp) "
+            "VALUES (2, 9.0, 'mist', '50d', 90, 1.0, 8.0, '2024-01-01 08:00:00')"
+        )
+    
+    async def migrate():
+        new_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        await create_db_and_tables(new_engine)
+        await new_engine.dispose()
+    
+    asyncio.run(migrate())
+    
+    with old_engine.connect() as conn:
+        indexes = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"ix_ws_loc_ts", "uq_loc_latlon"} <= indexes
+    
+    with Session(old_engine) as old_session:
+        locations = old_session.exec(select(Location)).all()
+        assert [l.id for l in locations] == [1]
+        # Settings from the dropped duplicate are kept on the surviving row
+        assert locations[0].is_favorite is True
+        assert locations[0].display_name == "Fav"
+        assert locations[0].last_synced == datetime(2024, 1, 1, 8)
+        assert [s.location_id for s in old_session.exec(select(WeatherSnapshot)).all()] == [1]
+    
+    # Adding an existing city upserts against the migrated unique index
+    migrated_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    
+    async def migrated_get_db():
+        async with AsyncSession(migrated_engine, expire_on_commit=False) as session:
+            yield session
+    
+    app.dependency_overrides[get_db] = migrated_get_db
+    try:
+        with patch("src.weather_api.get_coordinates", new_callable=AsyncMock) as mock_coords:
+            mock_coords.return_value = {"name": "Paris", "country": "FR", "lat": 48.8566, "lon": 2.3522}
+            response = client.post("/api/locations?city_name=Paris")
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+    
+    assert response.status_code == 200
+    assert response.json()["id"] == 1